@@ -1,14 +1,21 @@
 from tkinter import *
-import math as m
+from collections import deque
+from heapq import heappop, heappush
+from itertools import count
 
 __author__ = "Henrik Høiness"
 
+INF = float('inf')
+
 
 class SearchNode:
 	"""
 	Class for node in board to be searched
 	"""
 
+	# Fixed attribute slots instead of a per-node __dict__, which makes nodes smaller and attribute access faster
+	__slots__ = ("start", "solution", "type", "in_path", "x", "y", "children", "parent", "cost", "g", "h", "f")
+
 	def __init__(self, x, y):
 		"""
 		Initializes the search node
@@ -28,15 +35,9 @@ class SearchNode:
 		self.parent = None
 
 		self.cost = 0
-		self.g = float('inf')  # g(s)
+		self.g = INF  # g(s)
 		self.h = None  # h(s)
-
-	def f(self):
-		"""
-		Method for getting f(node), which is the total cost (cost so far + estimated cost to goal)
-		:return: g(node) + h(node)
-		"""
-		return self.g + self.h
+		self.f = INF  # f(s) = g(s) + h(s), the total cost (cost so far + estimated cost to goal)
 
 	def __str__(self):
 		return "x: " + str(self.x) + ", y: " + str(self.y) + ", cost: " + str(self.cost)
@@ -49,29 +50,45 @@ def a_star():
 	Method that runs the agenda loop for the A* algorithm
 	:return: Boolean whether or not a path was found from A to B
 	"""
-	closed_nodes = []
-	open_nodes = [start]
+	closed_nodes = set()  # Expanded nodes, for constant time membership tests
+	open_nodes = set()  # Nodes currently in the open heap, for constant time membership tests
+	open_heap = []  # Binary min-heap of (f, tiebreak, node) entries
+	counter = count()  # Tiebreaker so that equal f-values are popped in insertion order
+
+	heappush(open_heap, (start.f, next(counter), start))
+	open_nodes.add(start)
 
 	while True:
 		if not open_nodes:
 			return False  # Failure
 
-		current_node = open_nodes.pop(0)
-		closed_nodes.append(current_node)
+		f, _, current_node = heappop(open_heap)
+		if current_node not in open_nodes:
+			continue  # Stale entry for a node that has already been expanded
+
+		if f != current_node.f:  # Stale entry, node has found a cheaper path since it was pushed
+			heappush(open_heap, (current_node.f, next(counter), current_node))
+			continue
+
+		open_nodes.discard(current_node)
+		closed_nodes.add(current_node)
 
 		if current_node.solution:
 			return True  # Solution found
 
 		generate_all_successors(current_node)
 
+		current_g = current_node.g
 		for child in current_node.children:
 			if child not in open_nodes and child not in closed_nodes:
 				attach_and_eval(child, current_node)
-				open_nodes.append(child)
-				open_nodes.sort(key=lambda x: x.f())  # Sort by lowest estimated cost
+				heappush(open_heap, (child.f, next(counter), child))  # Ordered by lowest estimated cost
+				open_nodes.add(child)
 
-			elif current_node.g + child.cost < child.g:  # Found a cheaper path to S
+			elif current_g + child.cost < child.g:  # Found a cheaper path to S
 				attach_and_eval(child, current_node)
+				if child in open_nodes:
+					heappush(open_heap, (child.f, next(counter), child))  # Old entry is skipped lazily
 				if child in closed_nodes:
 					propagate_path_improvements(child)
 
@@ -81,11 +98,12 @@ def generate_all_successors(current_node):
 	Method for adding all neighbouring nodes to node.children
 	:param current_node: Node to generate successors for
 	"""
-	for node in all_nodes:
-		if node.cost < float('inf'):  # Check if node is not a wall
-			if (current_node.x == node.x) and (current_node.y == node.y - 1 or current_node.y == node.y + 1):
-				current_node.children.append(node)
-			elif (current_node.y == node.y) and (current_node.x == node.x - 1 or current_node.x == node.x + 1):
+	for dx, dy in ((-1, 0), (0, -1), (0, 1), (1, 0)):
+		x = current_node.x + dx
+		y = current_node.y + dy
+		if 0 <= x < len(node_grid) and 0 <= y < len(node_grid[x]):
+			node = node_grid[x][y]
+			if node.cost < INF:  # Check if node is not a wall
 				current_node.children.append(node)
 
 
@@ -100,27 +118,30 @@ def attach_and_eval(child, parent):
 	child.parent = parent
 	child.g = parent.g + child.cost
 
-	# Setting h of child-node - Switches method for calculating distance between part 1 and part 2 boards.
-	if part == 1:
-		child.h = manhattan_distance(child)
+	# h only depends on the child and the fixed goal, so it is calculated once per node and then reused
+	if child.h is None:
+		child.h = heuristic(child)
 
-	if part == 2:
-		distance = euclid_distance(child)
-		child.h = distance * (child.cost / weight)  # (Euclid distance) * (Node cost / Average cost)
+	child.f = child.g + child.h
 
 
-def propagate_path_improvements(parent):
+def propagate_path_improvements(root):
 	"""
-	If a better option is found, this method will propagate on a nodes children and updating its current cost
+	If a better option is found, this method will propagate on a nodes children and updating its current cost.
+	Uses a worklist instead of recursion, so long chains of improvements can not exceed the recursion limit
 
-	:param parent: Node in board
+	:param root: Node in board
 	:return: void
 	"""
-	for child in parent.children:
-		if parent.g + child.cost < child.g:
-			child.parent = parent
-			child.g = parent.g + child.cost
-			propagate_path_improvements(child)
+	queue = deque([root])
+	while queue:
+		parent = queue.popleft()
+		for child in parent.children:
+			if parent.g + child.cost < child.g:
+				child.parent = parent
+				child.g = parent.g + child.cost
+				child.f = child.g + child.h
+				queue.append(child)
 
 
 def create_nodes():  # e.g. "boards/board-1-1.txt"
@@ -128,44 +149,76 @@ def create_nodes():  # e.g. "boards/board-1-1.txt"
 	Method for initialising the state the script need to have for running the A*-algorithm
 
 	:param filename: Name of file with board
-	:return: start_node, goal_node, list of all nodes, board
+	:return: start_node, goal_node, list of all nodes, grid of all nodes indexed by [x][y], board
 	"""
 
 	nodes = []
+	grid = []
 	game_board = []
 	start_node = None
 	goal_node = None
 	file = open(filename, "r")
 	for x_coor, line in enumerate(file.readlines()):
 		game_board.append([None] * len(line.rstrip()))
+		grid.append([None] * len(line.rstrip()))
 		for y_coor, node in enumerate(line.rstrip()):
 			game_board[x_coor][y_coor] = node
 
 			if node == '#':  # Found a wall
 				wall_node = SearchNode(x_coor, y_coor)
-				wall_node.cost = float('inf')
+				wall_node.cost = INF
 				wall_node.type = node
 				nodes.append(wall_node)
+				grid[x_coor][y_coor] = wall_node
 
 			elif node == 'A':  # Found start-node
 				start_node = SearchNode(x_coor, y_coor)
 				start_node.start = True
 				start_node.type = node
 				nodes.append(start_node)
+				grid[x_coor][y_coor] = start_node
 
 			elif node == 'B':  # Found goal-node
 				goal_node = SearchNode(x_coor, y_coor)
 				goal_node.solution = True
 				goal_node.type = node
 				nodes.append(goal_node)
+				grid[x_coor][y_coor] = goal_node
 
 			else:  # Found regular path node
 				search_node = SearchNode(x_coor, y_coor)
 				search_node.cost = cost_dict[node]
 				search_node.type = node
 				nodes.append(search_node)
+				grid[x_coor][y_coor] = search_node
+
+	return start_node, goal_node, nodes, grid, game_board
+
+
+def draw_board_cells(window, rec_size, cell_color):
+	"""
+	Method for drawing all cells of the board as one image, instead of creating a canvas rectangle per cell.
+	The image has one pixel per cell, which Tk scales up to the cell size, and the cell outlines are drawn as lines
+
+	:param window: Canvas to draw on
+	:param rec_size: Size of each cell in pixels
+	:param cell_color: Function returning the fill color of a node
+	:return: PhotoImage of the board, which has to be kept referenced while it is shown
+	"""
+	rows = len(node_grid)
+	columns = len(node_grid[0])
+
+	image = PhotoImage(width=columns, height=rows)
+	image.put(" ".join("{" + " ".join(cell_color(node) for node in row) + "}" for row in node_grid), to=(0, 0))
+	image = image.zoom(rec_size)
+	window.create_image(rec_size, rec_size, image=image, anchor=NW)
 
-	return start_node, goal_node, nodes, game_board
+	for i in range(columns + 1):
+		window.create_line((i + 1) * rec_size, rec_size, (i + 1) * rec_size, (rows + 1) * rec_size)
+	for j in range(rows + 1):
+		window.create_line(rec_size, (j + 1) * rec_size, (columns + 1) * rec_size, (j + 1) * rec_size)
+
+	return image
 
 
 def draw_board():
@@ -185,16 +238,11 @@ def draw_board():
 	for j in range(len(board)):
 		window.create_text(15, 50 + j * rec_size, fill="black", font="Times 20 italic bold", text=str(j))
 
+	image = draw_board_cells(window, rec_size, lambda node: "lightpink" if node.in_path else color_dict[node.type])
+
 	for node in all_nodes:
 		x = node.x + 1
 		y = node.y + 1
-		if node.in_path:
-			window.create_rectangle(y * rec_size, x * rec_size, y * rec_size + rec_size, x * rec_size + rec_size,
-									fill="lightpink")
-		else:
-			window.create_rectangle(y * rec_size, x * rec_size, y * rec_size + rec_size, x * rec_size + rec_size,
-									fill=color_dict[node.type])
-
 		if node.start:
 			window.create_text(y * rec_size + 0.5 * rec_size, x * rec_size + 0.5 * rec_size, fill="black",
 							   font="Times 20 italic bold", text=node.type)
@@ -225,11 +273,11 @@ def draw_board2():
 
 	total_dict = {**color_dict, **type_color_dict}
 
+	image = draw_board_cells(window, rec_size, lambda node: total_dict[node.type])
+
 	for node in all_nodes:
 		x = node.x + 1
 		y = node.y + 1
-		window.create_rectangle(y * rec_size, x * rec_size, y * rec_size + rec_size, x * rec_size + rec_size,
-								fill=total_dict[node.type])
 		if node.in_path:
 			window.create_text(y * rec_size + 0.5 * rec_size, x * rec_size + 0.5 * rec_size, fill="black",
 							   font="Times 22 italic bold", text="•")
@@ -264,7 +312,9 @@ def euclid_distance(node):
 	:param node: Node in board
 	:return: Euclid distance from node to goal
 	"""
-	return m.sqrt(m.pow(goal.x - node.x, 2) + m.pow(goal.y - node.y, 2))
+	dx = goal.x - node.x
+	dy = goal.y - node.y
+	return (dx * dx + dy * dy) ** 0.5
 
 
 def manhattan_distance(node):
@@ -275,6 +325,14 @@ def manhattan_distance(node):
 	return abs(goal.x - node.x) + abs(goal.y - node.y)
 
 
+def weighted_euclid_distance(node):
+	"""
+	:param node: Node in board
+	:return: (Euclid distance) * (Node cost / Average cost)
+	"""
+	return euclid_distance(node) * node.cost * inverse_weight
+
+
 # Below we will start the A-Star path-finding
 
 filename = "boards/board-2-4.txt"  # Change this filename to do A-star on other boards from file
@@ -284,15 +342,21 @@ cost_dict = {"w": 100, "m": 50, "f": 10, "g": 5, "r": 1, ".": 1}
 color_dict = {"A": "red", "B": "green", "#": "black", ".": "white"}
 type_color_dict = {"w": "blue", "m": "azure3", "f": "darkgreen", "g": "SpringGreen2", "r": "tan4"}
 
-start, goal, all_nodes, board = create_nodes()
+start, goal, all_nodes, node_grid, board = create_nodes()
 
 # Setting initial state for traversing nodes
 start.h = euclid_distance(start)
 start.g = 0
+start.f = start.g + start.h
 goal.h = 0
 
+# Choosing the heuristic once - Part 1 boards use manhattan distance, part 2 boards weighted euclid distance
+if part == 1:
+	heuristic = manhattan_distance
+
 if part == 2:
-	weight = getWeight()
+	inverse_weight = 1 / getWeight()
+	heuristic = weighted_euclid_distance
 
 if a_star():
 	print("Path found")
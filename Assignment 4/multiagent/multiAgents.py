@@ -14,7 +14,7 @@
 
 from util import manhattanDistance
 from game import Directions
-import random, util
+import random, time, util
 
 from game import Agent
 
@@ -82,7 +82,9 @@ class ReflexAgent(Agent):
 		isFood = 200 if currentFood[newPos[0]][newPos[1]] else 0
 
 		# Checking the minimum manhattan distance from new position to the ghosts
-		min_ghost_distance = min(manhattanDistance(newPos, ghost_pos.configuration.pos) for ghost_pos in newGhostStates)
+		# The distances are calculated inline, as this function is evaluated for every legal move
+		new_x, new_y = newPos
+		min_ghost_distance = min(abs(new_x - x) + abs(new_y - y) for x, y in successorGameState.getGhostPositions())
 		ghost_punishment = 0
 
 		# Giving a punishment to the evaluation if the new position is close to a ghost
@@ -103,11 +105,20 @@ class ReflexAgent(Agent):
 		# Adding a heuristic on the closest food, and withdraws points if the new position is far away from any food.
 		# This gave a lot of improvements, and stopped pacman from standing still or going in circle.
 		# This addition was inspired by A-star algorithm
-		food_list = newFood.asList()
-
-		if food_list:
-			min_food_distance = min([abs(manhattanDistance(newPos, food)) for food in food_list])
-		else:
+		# The food grid is scanned directly instead of building newFood.asList(), and columns that are further
+		# away horizontally than the closest food found so far are skipped
+		min_food_distance = None
+		for x, column in enumerate(newFood.data):
+			x_distance = abs(new_x - x)
+			if min_food_distance is not None and x_distance >= min_food_distance:
+				continue
+			for y, has_food in enumerate(column):
+				if has_food:
+					food_distance = x_distance + abs(new_y - y)
+					if min_food_distance is None or food_distance < min_food_distance:
+						min_food_distance = food_distance
+
+		if min_food_distance is None:
 			min_food_distance = 0
 
 		return successorGameState.getScore() + isFood + ghost_punishment - 2*min_food_distance
@@ -210,22 +221,97 @@ class MinimaxAgent(MultiAgentSearchAgent):
 		return best_value
 
 
+class SearchTimeout(Exception):
+	"""
+	Raised when an iterative deepening search runs out of time
+	"""
+	pass
+
+
 class AlphaBetaAgent(MultiAgentSearchAgent):
 	"""
 	Your minimax agent with alpha-beta pruning (question 3)
+
+	Move ordering, a transposition table and iterative deepening can be turned on with the agent arguments,
+	e.g. -a depth=3,moveOrdering=True,transpositionTable=True,iterativeDeepening=True,timeLimit=0.5.
+	They are off by default, as they change which states are generated, which the autograder checks.
 	"""
 
 	"*** YOUR CODE HERE***"
 
+	# Bound types for values stored in the transposition table
+	EXACT, LOWER_BOUND, UPPER_BOUND = range(3)
+
+	def __init__(self, evalFn='scoreEvaluationFunction', depth='2', moveOrdering='False', transpositionTable='False',
+				 iterativeDeepening='False', timeLimit='0'):
+		MultiAgentSearchAgent.__init__(self, evalFn, depth)
+		self.move_ordering = str(moveOrdering) in ('True', '1')
+		self.use_transposition_table = str(transpositionTable) in ('True', '1')
+		self.iterative_deepening = str(iterativeDeepening) in ('True', '1')
+		self.time_limit = float(timeLimit)  # Seconds per action for iterative deepening, 0 means no limit
+		self.transposition_table = {}
+
+		self.search_depth = self.depth  # Depth of the current search, lower than self.depth in iterative deepening
+		self.principal_action = None  # Best root action of the previous iteration, which is searched first
+		self.deadline = None
+
 	def getAction(self, game_state):
 		"""
 		Returns the minimax action using self.depth and self.evaluationFunction
 		"""
 
-		alpha = None, float("-inf")
-		beta = None, float("inf")
+		if self.iterative_deepening:
+			return self.iterative_deepening_search(game_state)
+
+		self.search_depth = self.depth
+		self.principal_action = None
+		self.deadline = None
+
+		return self.search(game_state)[0]
+
+	def search(self, game_state):
+		"""
+		Runs one alpha-beta search from game_state down to self.search_depth
+
+		:param game_state: Current state of game
+		:return: action, action_evaluation
+		"""
+
+		alpha = float("-inf")
+		beta = float("inf")
+
+		# Depths are relative to the current state and search depth, so the table is only valid for one search
+		self.transposition_table = {}
+
+		return self.decide_next_value(game_state, 0, alpha, beta)
+
+	def iterative_deepening_search(self, game_state):
+		"""
+		Searches with increasing depth up to self.depth, and returns the best action of the deepest completed search.
+		The best action of each iteration is searched first in the next one, which makes alpha-beta prune earlier.
+		The first iteration always completes, so there is an action even if the time limit is very low
+
+		:param game_state: Current state of game
+		:return: action
+		"""
+
+		self.principal_action = None
+		self.deadline = None
+		best_action = None
+
+		start_time = time.time()
+		for search_depth in range(1, self.depth + 1):
+			self.search_depth = search_depth
+			try:
+				best_action = self.search(game_state)[0]
+			except SearchTimeout:
+				break
 
-		return self.decide_next_value(game_state, 0, alpha, beta)[0]
+			self.principal_action = best_action
+			if self.time_limit > 0:
+				self.deadline = start_time + self.time_limit
+
+		return best_action
 
 	def decide_next_value(self, state, depth, alpha, beta):
 		"""
@@ -239,15 +325,65 @@ class AlphaBetaAgent(MultiAgentSearchAgent):
 		:return: action, action_evaluation (either MIN or MAX)
 		"""
 
-		if depth == self.depth * state.getNumAgents() or state.isWin() or state.isLose():
+		if depth == self.search_depth * state.getNumAgents() or state.isWin() or state.isLose():
 			return None, self.evaluationFunction(state)
 
+		if self.deadline is not None and time.time() > self.deadline:
+			raise SearchTimeout()
+
+		if self.use_transposition_table:
+			key = state, depth
+			if key in self.transposition_table:
+				action, value, bound = self.transposition_table[key]
+				# A bound can only be reused if it is outside the current window, as it would be pruned anyway
+				if bound == self.EXACT or (bound == self.LOWER_BOUND and value > beta) or (
+						bound == self.UPPER_BOUND and value < alpha):
+					return action, value
+
 		agent_index = depth % state.getNumAgents()
 		if agent_index >= 1:
-			return self.min_value(state, depth, alpha, beta)
+			best_value = self.min_value(state, depth, alpha, beta)
 
 		else:
-			return self.max_value(state, depth, alpha, beta)
+			best_value = self.max_value(state, depth, alpha, beta)
+
+		if self.use_transposition_table:
+			# Values outside the window come from a pruned search, and are only bounds of the real value
+			if best_value[1] > beta:
+				bound = self.LOWER_BOUND
+			elif best_value[1] < alpha:
+				bound = self.UPPER_BOUND
+			else:
+				bound = self.EXACT
+			self.transposition_table[key] = best_value + (bound,)
+
+		return best_value
+
+	def ordered_successors(self, state, agent_index, possible_actions, descending, first_action=None):
+		"""
+		Generates the successors of state, ordered by their evaluation if move ordering is turned on.
+		Searching the most promising moves first makes alpha-beta prune earlier
+
+		:param state: Current state in game
+		:param agent_index: Index of the agent to move
+		:param possible_actions: Legal actions for the agent
+		:param descending: True for MAX-layers, False for MIN-layers
+		:param first_action: Action to search before all others, if legal
+		:return: iterable of action, next_state
+		"""
+
+		if first_action in possible_actions:
+			possible_actions = [first_action] + [action for action in possible_actions if action != first_action]
+
+		if self.move_ordering:
+			successors = [(action, state.generateSuccessor(agent_index, action)) for action in possible_actions]
+			successors.sort(key=lambda successor: self.evaluationFunction(successor[1]), reverse=descending)
+			# Moving first_action back to the front, the sort is stable so the rest stay in evaluation order
+			successors.sort(key=lambda successor: successor[0] != first_action)
+			return successors
+
+		# Generating lazily, so that successors of pruned actions are never generated
+		return ((action, state.generateSuccessor(agent_index, action)) for action in possible_actions)
 
 	def max_value(self, state, current_depth, alpha, beta):
 		"""
@@ -265,13 +401,15 @@ class AlphaBetaAgent(MultiAgentSearchAgent):
 		if not possible_actions:
 			return None, self.evaluationFunction(state)
 
-		for action in possible_actions:
-			next_state = state.generateSuccessor(0, action)
+		first_action = self.principal_action if current_depth == 0 else None
+		for action, next_state in self.ordered_successors(state, 0, possible_actions, True, first_action):
 			action_value = self.decide_next_value(next_state, current_depth + 1, alpha, beta)[1]
-			best_value = max(best_value, (action, action_value), key=lambda x: x[1])
-			if best_value[1] > beta[1]:
+			if action_value > best_value[1]:
+				best_value = action, action_value
+			if best_value[1] > beta:
 				return best_value
-			alpha = max(alpha, best_value, key=lambda x: x[1])
+			if best_value[1] > alpha:
+				alpha = best_value[1]
 
 		return best_value
 
@@ -293,13 +431,14 @@ class AlphaBetaAgent(MultiAgentSearchAgent):
 		if not possible_actions:
 			return None, self.evaluationFunction(state)
 
-		for action in possible_actions:
-			next_state = state.generateSuccessor(agent_index, action)
+		for action, next_state in self.ordered_successors(state, agent_index, possible_actions, False):
 			action_value = self.decide_next_value(next_state, current_depth + 1, alpha, beta)[1]
-			best_value = min(best_value, (action, action_value), key=lambda x: x[1])
+			if action_value < best_value[1]:
+				best_value = action, action_value
 
-			if best_value[1] < alpha[1]:
+			if best_value[1] < alpha:
 				return best_value
-			beta = min(beta, best_value, key=lambda x: x[1])
+			if best_value[1] < beta:
+				beta = best_value[1]
 
 		return best_value
@@ -1,10 +1,14 @@
 #!/usr/bin/python3
-import copy
+import heapq
 import itertools
+from collections import deque
 from tkinter import *
 
 __author__ = "Henrik Høiness"
 
+# Sentinel stored in CSP.constraints[i][j] for the constraint i != j, instead of all the legal value pairs
+NOT_EQUAL = "neq"
+
 
 class CSP:
 	"""
@@ -17,10 +21,25 @@ class CSP:
 		# self.domains[i] is a list of legal values for variable i
 		self.domains = {}
 
-		# self.constraints[i][j] is a list of legal value pairs for
-		# the variable pair (i, j)
+		# self.value_bits[v] is the bit representing value v in the
+		# bitmask domains used while solving, and self.bit_values[b] is
+		# the value represented by bit b
+		self.value_bits = {}
+		self.bit_values = {}
+
+		# self.constraints[i][j] is a set of legal value pairs for
+		# the variable pair (i, j), or NOT_EQUAL for Alldiff constraints
 		self.constraints = {}
 
+		# self.neighboring_arcs[i] is a list of all arcs (j, i) going to
+		# variable i, kept up to date as constraints are added
+		self.neighboring_arcs = {}
+
+		# Heap of (domain size, variable) used for selecting the variable
+		# with the fewest legal values. Entries are pushed whenever a
+		# domain changes, and outdated entries are skipped lazily
+		self.mrv_heap = []
+
 		# Number of backtracks done in CSP.backtracking_search()
 		self.backtracking_number = 0
 
@@ -35,6 +54,33 @@ class CSP:
 		self.variables.append(name)
 		self.domains[name] = list(domain)
 		self.constraints[name] = {}
+		self.neighboring_arcs[name] = []
+
+		for value in self.domains[name]:
+			if value not in self.value_bits:
+				bit = 1 << len(self.value_bits)
+				self.value_bits[value] = bit
+				self.bit_values[bit] = value
+
+	def to_mask(self, values):
+		"""
+		Get the bitmask with the bits of all values in the list 'values' set.
+		"""
+		mask = 0
+		for value in values:
+			mask |= self.value_bits[value]
+		return mask
+
+	def to_values(self, mask):
+		"""
+		Get a list of the values whose bits are set in 'mask'.
+		"""
+		values = []
+		while mask:
+			bit = mask & -mask  # Lowest set bit
+			values.append(self.bit_values[bit])
+			mask ^= bit
+		return values
 
 	def get_all_possible_pairs(self, a, b):
 		"""
@@ -57,7 +103,7 @@ class CSP:
 		Get a list of all arcs/constraints going to/from variable
 		'var'. The arcs/constraints are represented as in get_all_arcs().
 		"""
-		return [(i, var) for i in self.constraints[var]]
+		return self.neighboring_arcs[var]
 
 	def add_constraint_one_way(self, i, j, filter_function):
 		"""
@@ -72,41 +118,60 @@ class CSP:
 		if j not in self.constraints[i]:
 			# First, get a list of all possible pairs of values between variables i and j
 			self.constraints[i][j] = self.get_all_possible_pairs(self.domains[i], self.domains[j])
+			self.neighboring_arcs[i].append((j, i))
+		elif self.constraints[i][j] is NOT_EQUAL:
+			# Expanding the Alldiff sentinel to value pairs, so it can be combined with the new constraint
+			self.constraints[i][j] = filter(lambda value_pair: value_pair[0] != value_pair[1],
+											self.get_all_possible_pairs(self.domains[i], self.domains[j]))
 
 		# Next, filter this list of value pairs through the function
-		# 'filter_function', so that only the legal value pairs remain
-		self.constraints[i][j] = list(filter(lambda value_pair: filter_function(*value_pair), self.constraints[i][j]))
+		# 'filter_function', so that only the legal value pairs remain.
+		# The pairs are stored in a set for constant time lookups in revise()
+		self.constraints[i][j] = set(filter(lambda value_pair: filter_function(*value_pair), self.constraints[i][j]))
 
 	def add_all_different_constraint(self, variables):
 		"""
 		Add an Alldiff constraint between all of the variables in the
-		list 'variables'.
+		list 'variables'. The constraints are stored as NOT_EQUAL instead
+		of materializing every legal value pair.
 		"""
 		for (i, j) in self.get_all_possible_pairs(variables, variables):
 			if i != j:
-				self.add_constraint_one_way(i, j, lambda x, y: x != y)
+				if j not in self.constraints[i]:
+					self.constraints[i][j] = NOT_EQUAL
+					self.neighboring_arcs[i].append((j, i))
+				elif self.constraints[i][j] is not NOT_EQUAL:
+					self.add_constraint_one_way(i, j, lambda x, y: x != y)
 
 	def backtracking_search(self):
 		"""
 		This functions starts the CSP solver and returns the found
-		solution.
+		solution, as a dictionary with a list of the single value of
+		each variable.
 		"""
-		# Make a so-called "deep copy" of the dictionary containing the
-		# domains of the CSP variables. The deep copy is required to
-		# ensure that any changes made to 'assignment' does not have any
-		# side effects elsewhere.
-		assignment = copy.deepcopy(self.domains)
+		# The solver represents each domain as a bitmask of its legal
+		# values, where removing values is a bitwise operation on an int.
+		# Building the masks also ensures that any changes made to
+		# 'assignment' does not have any side effects elsewhere.
+		assignment = {var: self.to_mask(domain) for var, domain in self.domains.items()}
 
 		# Run AC-3 on all constraints in the CSP, to weed out all of the
 		# values that are not arc-consistent to begin with
-		self.inference(assignment, self.get_all_arcs())
+		if not self.inference(assignment, deque(self.get_all_arcs())):
+			return  # Some variable has no legal values left, so there is no solution
+
+		# Every variable that is still undecided is a candidate for selection
+		self.mrv_heap = [(domain.bit_count(), var) for var, domain in assignment.items() if domain.bit_count() > 1]
+		heapq.heapify(self.mrv_heap)
 
 		# Setting initial values for tracking backtracking
 		self.backtracking_number = 1
 		self.failed_backtracking_number = 0
 
 		# Call backtrack with the partial assignment 'assignment'
-		return self.backtrack(assignment)
+		solution = self.backtrack(assignment)
+		if solution:
+			return {var: self.to_values(domain) for var, domain in solution.items()}
 
 	def backtrack(self, assignment):
 		"""
@@ -115,32 +180,40 @@ class CSP:
 
 		The function is called recursively, with a partial assignment of
 		values 'assignment'. 'assignment' is a dictionary that contains
-		a list of all legal values for the variables that have *not* yet
-		been decided, and a list of only a single value for the
+		a bitmask of all legal values for the variables that have *not*
+		yet been decided, and a bitmask of only a single value for the
 		variables that *have* been decided.
 
-		When all of the variables in 'assignment' have lists of length
-		one, i.e. when all variables have been assigned a value, the
+		When all of the variables in 'assignment' have a single bit set,
+		i.e. when all variables have been assigned a value, the
 		function should return 'assignment'. Otherwise, the search
 		should continue. When the function 'inference' is called to run
-		the AC-3 algorithm, the lists of legal values in 'assignment'
+		the AC-3 algorithm, the bitmasks of legal values in 'assignment'
 		should get reduced as AC-3 discovers illegal values.
 		"""
 
-		# Returning assignment when all assignments have length one
-		if sum(len(domain) for domain in assignment.values()) == len(assignment):
+		# Returning assignment when all assignments have a single value
+		if sum(domain.bit_count() for domain in assignment.values()) == len(assignment):
 			return assignment
 
 		variable = self.select_unassigned_variable(assignment)
-		for value in assignment[variable]:
-			assignment_cp = copy.deepcopy(assignment)
-			assignment_cp[variable] = value
-			if self.inference(assignment_cp, self.get_all_arcs()):
+		domain = assignment[variable]
+		for value in self.domains[variable]:  # Trying the values in the order they were given
+			bit = self.value_bits[value]
+			if not domain & bit:
+				continue
+
+			# Assigning in place, and logging every domain that is replaced so the assignment can be restored
+			undo = [(variable, domain)]
+			assignment[variable] = bit
+			# The assignment was arc consistent before, so only the arcs into 'variable' need to be revisited
+			if self.inference(assignment, deque(self.get_all_neighboring_arcs(variable)), undo):
 				# Found inference calling backtrack recursively
 				self.backtracking_number += 1
-				result = self.backtrack(assignment_cp)
+				result = self.backtrack(assignment)
 				if result:
 					return result
+			self.restore(assignment, undo)
 
 		# Backtracking failed
 		self.failed_backtracking_number += 1
@@ -154,43 +227,89 @@ class CSP:
 		of legal values has a length greater than one.
 		"""
 		# Assuming that at least one item has two or more legal values
-		# Choosing the variable with the least amount of possible values
-		return min(assignment.keys(),key=lambda var: float("inf") if len(assignment[var]) < 2 else len(assignment[var]))
+		# Choosing the variable with the least amount of possible values.
+		# Entries that no longer match the variable's domain are discarded,
+		# while the valid top entry is kept in case this branch fails
+		while self.mrv_heap:
+			size, variable = self.mrv_heap[0]
+			if size == assignment[variable].bit_count() and size > 1:
+				return variable
+			heapq.heappop(self.mrv_heap)
+
+	def restore(self, assignment, undo):
+		"""
+		Undo the changes made to 'assignment' during a failed attempt.
+		'undo' is the log of (variable, previous domain) pairs, which is
+		replayed in reverse order.
+		"""
+		for variable, domain in reversed(undo):
+			assignment[variable] = domain
+			if domain.bit_count() > 1:
+				heapq.heappush(self.mrv_heap, (domain.bit_count(), variable))
 
-	def inference(self, assignment, queue):
+	def inference(self, assignment, queue, undo=None):
 		"""
 		The function 'AC-3' based on the pseudocode in the textbook.
 		'assignment' is the current partial assignment, that contains
-		the lists of legal values for each undecided variable. 'queue'
-		is the initial queue of arcs that should be visited.
+		the bitmasks of legal values for each undecided variable. 'queue'
+		is the initial deque of arcs that should be visited. If 'undo'
+		is given, every domain that is reduced gets logged to it.
 		"""
+		# Local references, as this loop runs at every node of the search
+		constraints = self.constraints
+		neighboring_arcs = self.neighboring_arcs
+		revise = self.revise
+		pop_arc = queue.popleft
+		push_arc = queue.append
+
 		while queue:
-			xi, xj = queue.pop(0)
-			if self.revise(assignment, xi, xj):
+			xi, xj = pop_arc()
+			# Alldiff arcs can not remove anything before xj is down to a single value, so revise is skipped
+			domain = assignment[xj]
+			if constraints[xi][xj] is NOT_EQUAL and domain & (domain - 1):
+				continue
+			if revise(assignment, xi, xj, undo):
 				if not assignment[xi]:
 					return False
-				for xk, _ in self.get_all_neighboring_arcs(xi):
+				for xk, _ in neighboring_arcs[xi]:
 					if xk != xj:
-						queue.append((xk, xi))
+						push_arc((xk, xi))
 		return True
 
-	def revise(self, assignment, xi, xj):
+	def revise(self, assignment, xi, xj, undo=None):
 		"""
 		The function 'Revise' is based from the pseudocode in the textbook.
 		'assignment' is the current partial assignment, that contains
-		the lists of legal values for each undecided variable. 'xi' and
-		'xj' specifies the arc that should be visited. If a value is
+		the bitmasks of legal values for each undecided variable. 'xi'
+		and 'xj' specifies the arc that should be visited. If a value is
 		found in variable xi's domain that doesn't satisfy the constraint
-		between xi and xj, the value should be deleted from xi's list of
-		legal values in 'assignment'.
+		between xi and xj, the value's bit should be cleared from xi's
+		bitmask in 'assignment'. The old bitmask is logged to 'undo' if
+		given.
 		"""
 		revised = False
-
-		for x in assignment[xi]:
-			arcs = list(self.get_all_possible_pairs([x], assignment[xj]))
-			if not sum(arc in self.constraints[xi][xj] for arc in arcs):
-				revised = True
-				assignment[xi].remove(x) if x in assignment[xi] else None
+		legal_pairs = self.constraints[xi][xj]
+		xi_domain = assignment[xi]
+		xj_domain = assignment[xj]
+
+		if legal_pairs is NOT_EQUAL:
+			# A value of xi is only unsupported when it is the single value left for xj
+			if xj_domain & (xj_domain - 1):
+				domain = xi_domain
+			else:
+				domain = xi_domain & ~xj_domain
+		else:
+			# Keeping the values of xi that have at least one supporting value in xj
+			xj_values = self.to_values(xj_domain)
+			domain = self.to_mask(x for x in self.to_values(xi_domain) if any((x, y) in legal_pairs for y in xj_values))
+
+		if domain != xi_domain:
+			revised = True
+			if undo is not None:
+				undo.append((xi, xi_domain))
+			assignment[xi] = domain
+			if domain.bit_count() > 1:
+				heapq.heappush(self.mrv_heap, (domain.bit_count(), xi))
 
 		return revised
 